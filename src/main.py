@@ -6,6 +6,10 @@ import sys
 from puzzle_generator import PuzzleGenerator
 from tracker import PerformanceTracker
 from adaptive_engine import AdaptiveEngine
+from report_engine import save_session
+
+# Finished sessions are appended here for cohort reports
+SESSION_STORE = 'sessions.jsonl'
 
 class MathAdventure:
     def __init__(self):
@@ -29,6 +33,15 @@ class MathAdventure:
             name = "Student"
         
         print(f"\nHello, {name}")
+        
+        # Optional labels so teachers can group sessions by school and class
+        cohort = {}
+        school = input("School (optional): ").strip()
+        class_name = input("Class (optional): ").strip()
+        if school:
+            cohort['school'] = school
+        if class_name:
+            cohort['class'] = class_name
         print("\nChoose your starting difficulty:")
         print("1. Easy (numbers 1-10, +/-)")
         print("2. Medium (numbers 10-50, +/-/*)")
@@ -45,7 +58,7 @@ class MathAdventure:
         method_choice = input("\nEnter choice (1/2) [default: 1]: ").strip()
         method = 'ml-based' if method_choice == '2' else 'rule-based'
         
-        self.tracker = PerformanceTracker(name)
+        self.tracker = PerformanceTracker(name, cohort=cohort)
         self.engine = AdaptiveEngine(method=method, window_size=5)
         
         print(f"\n Starting at {self.current_difficulty.upper()} level")
@@ -153,6 +166,15 @@ class MathAdventure:
         
         print("\n" + "="*60)
     
+    def save_progress(self):
+        #Store the finished session for cohort reports
+        if not self.tracker or not self.tracker.attempts:
+            return
+        try:
+            save_session(SESSION_STORE, self.tracker)
+        except OSError as e:
+            print(f"\nCould not save session: {e}")
+    
     def run(self):
         #Main application loop
         try:
@@ -175,12 +197,14 @@ class MathAdventure:
             
             # Display final summary
             self.display_summary()
+            self.save_progress()
             print("\nThank you for learning with Math Adventures! \n")
             
         except KeyboardInterrupt:
             print("\n\nSession interrupted by user.")
             if self.tracker and self.tracker.attempts:
                 self.display_summary()
+                self.save_progress()
         except Exception as e:
             print(f"\nAn error occurred: {e}")
             sys.exit(1)
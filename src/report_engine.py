@@ -0,0 +1,473 @@
+"""
+Cohort reports - rolls up many stored sessions into class and school level stats
+"""
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import reduce
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming sketch for response times.
+
+    Values are counted in logarithmic buckets so every quantile comes back
+    within `relative_accuracy` of the true value, and two sketches merge by
+    adding their bucket counts. Memory depends on the spread of the values,
+    not on how many were added.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0  # values at or below min_value
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value <= self.min_value:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+            self._collapse()
+
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Midpoint of the bucket, kept inside the observed range
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return max(self.min, min(self.max, estimate))
+
+        return self.max
+
+    def _collapse(self):
+        # Fold the lowest buckets together once the sketch grows past max_bins
+        if len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        folded = sum(self.bins.pop(k) for k in excess)
+        target = excess[-1]
+        self.bins[target] = self.bins.get(target, 0) + folded
+
+
+def save_session(path, tracker):
+    # Append one finished session to a JSON lines store
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(tracker.export_session()) + "\n")
+
+
+def _store_files(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl')
+        )
+    return [path]
+
+
+def load_sessions(path):
+    # Read every session from a JSON lines file, or from all .jsonl files in a directory
+    # Lines that fail to parse (e.g. a half-written last record) are skipped
+    sessions = []
+    for file_path in _store_files(path):
+        sessions.extend(
+            s for s in _read_range(file_path, 0, os.path.getsize(file_path)) if s is not None
+        )
+    return sessions
+
+
+def _read_range(file_path, start, end):
+    # Yield the sessions whose line starts inside [start, end) of a JSON lines file,
+    # or None for a line that is not a valid record
+    with open(file_path, 'rb') as f:
+        if start > 0:
+            # Skip the line that straddles the boundary; the previous range owns it
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else None
+
+
+def _store_shards(path, shard_count):
+    # Split the store into byte ranges of roughly equal size
+    files = [(p, os.path.getsize(p)) for p in _store_files(path)]
+    total = sum(size for _, size in files)
+    shard_bytes = max(1, math.ceil(total / max(1, shard_count)))
+
+    shards = []
+    for file_path, size in files:
+        for start in range(0, size, shard_bytes):
+            shards.append((file_path, start, min(size, start + shard_bytes)))
+    return shards
+
+
+def _new_counts():
+    # Times are summed in hundredths of a second (the tracker's precision) so
+    # totals are exact integers whatever order the shards merge in
+    return {'attempts': 0, 'correct': 0, 'time_sum': 0}
+
+
+def _new_group(relative_accuracy):
+    return {
+        'sessions': 0,
+        'counts': _new_counts(),
+        'time_sketch': QuantileSketch(relative_accuracy),
+        'by_difficulty': {},
+        'by_operation': {},
+        'learners': {}
+    }
+
+
+def _new_partial():
+    return {'groups': {}, 'skipped_records': 0}
+
+
+def _add_counts(counts, attempts, correct, time_sum):
+    counts['attempts'] += attempts
+    counts['correct'] += correct
+    counts['time_sum'] += time_sum
+
+
+def _group_key(session, group_by):
+    cohort = session.get('cohort') or {}
+    return " / ".join(str(cohort.get(label, 'unknown')) for label in group_by)
+
+
+def _learner_key(session):
+    # Names are only unique within a class, so the full cohort is part of the key
+    cohort = session.get('cohort') or {}
+    return tuple(sorted((str(k), str(v)) for k, v in cohort.items())), session['user_name']
+
+
+def _learner_state(session):
+    """
+    Summary of one session for stuck detection.
+
+    `level` is where the session ended and `run_*` describe the attempts at
+    that level at the end of the session. `open` means the whole session
+    stayed at that level, so the run may continue into older sessions.
+    """
+    attempts = session['attempts']
+    start = session.get('session_start', '')
+    level = attempts[-1]['difficulty']
+    run_length = 0
+    run_correct = 0
+    for attempt in reversed(attempts):
+        if attempt['difficulty'] != level:
+            break
+        run_length += 1
+        run_correct += 1 if attempt['is_correct'] else 0
+
+    return {
+        'sessions': 1,
+        'first': start,
+        'last': start,
+        'level': level,
+        'run_length': run_length,
+        'run_correct': run_correct,
+        'run_sessions': 1,
+        'since': start,
+        'open': run_length == len(attempts)
+    }
+
+
+def _merge_learner(state, other):
+    """
+    Combine the summaries of two blocks of one learner's sessions.
+
+    The newer block's trailing run is extended by the older block's only
+    when every newer session stayed at the same level. The state is a fixed
+    size however many sessions it covers. Blocks are ordered by time rather
+    than by argument, so the result does not depend on merge order as long
+    as the blocks do not interleave in time. Sorting sessions by start time
+    before sharding (and appending to the store as sessions finish) ensures
+    they do not.
+    """
+    older, newer = sorted((state, other), key=lambda s: (s['last'], s['first']))
+    merged = dict(newer)
+    merged['sessions'] = older['sessions'] + newer['sessions']
+    merged['first'] = min(older['first'], newer['first'])
+    merged['last'] = max(older['last'], newer['last'])
+
+    if newer['open'] and older['level'] == newer['level']:
+        merged['run_length'] = older['run_length'] + newer['run_length']
+        merged['run_correct'] = older['run_correct'] + newer['run_correct']
+        merged['run_sessions'] = older['run_sessions'] + newer['run_sessions']
+        merged['since'] = older['since']
+        merged['open'] = older['open']
+    else:
+        merged['open'] = False
+    return merged
+
+
+def _add_session(partial, session, group_by, relative_accuracy):
+    attempts = session.get('attempts') or []
+    if not attempts:
+        return
+
+    groups = partial['groups']
+    key = _group_key(session, group_by)
+    group = groups.get(key)
+    if group is None:
+        group = groups[key] = _new_group(relative_accuracy)
+    group['sessions'] += 1
+
+    for attempt in attempts:
+        correct = 1 if attempt['is_correct'] else 0
+        time_taken = attempt['time_taken']
+        centis = round(time_taken * 100)
+
+        _add_counts(group['counts'], 1, correct, centis)
+        group['time_sketch'].add(time_taken)
+
+        difficulty = group['by_difficulty'].setdefault(attempt['difficulty'], _new_counts())
+        _add_counts(difficulty, 1, correct, centis)
+        operation = group['by_operation'].setdefault(attempt['operation'], _new_counts())
+        _add_counts(operation, 1, correct, centis)
+
+    learner = _learner_key(session)
+    state = _learner_state(session)
+    if learner in group['learners']:
+        state = _merge_learner(group['learners'][learner], state)
+    group['learners'][learner] = state
+
+
+def _aggregate_shard(shard, group_by, relative_accuracy):
+    # Partial aggregates for one shard of in-memory sessions
+    partial = _new_partial()
+    for session in shard:
+        _add_session(partial, session, group_by, relative_accuracy)
+    return partial
+
+
+def _aggregate_store_shard(shard, group_by, relative_accuracy):
+    # Partial aggregates for one byte range of the store; the worker reads it itself
+    partial = _new_partial()
+    for session in _read_range(*shard):
+        if session is None:
+            partial['skipped_records'] += 1
+            continue
+        try:
+            _add_session(partial, session, group_by, relative_accuracy)
+        except (KeyError, TypeError):
+            # Parsed, but not shaped like a stored session
+            partial['skipped_records'] += 1
+    return partial
+
+
+def _merge_group(group, other):
+    group['sessions'] += other['sessions']
+    _add_counts(group['counts'], **other['counts'])
+    group['time_sketch'].merge(other['time_sketch'])
+
+    for field in ('by_difficulty', 'by_operation'):
+        for name, counts in other[field].items():
+            _add_counts(group[field].setdefault(name, _new_counts()), **counts)
+
+    for learner, state in other['learners'].items():
+        if learner in group['learners']:
+            state = _merge_learner(group['learners'][learner], state)
+        group['learners'][learner] = state
+    return group
+
+
+def _merge_partials(partial, other):
+    for key, group in other['groups'].items():
+        if key in partial['groups']:
+            _merge_group(partial['groups'][key], group)
+        else:
+            partial['groups'][key] = group
+    partial['skipped_records'] += other['skipped_records']
+    return partial
+
+
+class CohortReportEngine:
+    def __init__(self, group_by=('school', 'class'), workers=None, stuck_after=10,
+                 mastery_threshold=0.8, relative_accuracy=0.01,
+                 difficulty_order=('easy', 'medium', 'hard')):
+
+        self.group_by = tuple(group_by)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1")
+        # A learner is stuck after this many attempts in a row at one level
+        # without reaching mastery_threshold accuracy there. The top level is
+        # never reported since there is nothing to move up to.
+        self.stuck_after = stuck_after
+        self.mastery_threshold = mastery_threshold  # rule-based AdaptiveEngine's increase threshold
+        self.relative_accuracy = relative_accuracy
+        self.difficulty_order = tuple(difficulty_order)
+        self.quantiles = {'p25': 0.25, 'p50': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+    def generate_report(self, sessions):
+        """
+        Build a cohort report from sessions already in memory
+
+        Args:
+            sessions (list): PerformanceTracker objects or records from
+                `PerformanceTracker.export_session` / `load_sessions`
+
+        Returns:
+            dict: Per-group stats plus an 'overall' rollup
+        """
+        records = [s.export_session() if hasattr(s, 'export_session') else s for s in sessions]
+        # Time order keeps each shard a contiguous block of every learner's history
+        records.sort(key=lambda r: (r.get('session_start', ''), r.get('user_name', '')))
+
+        if self.workers <= 1 or len(records) < 2:
+            partial = _aggregate_shard(records, self.group_by, self.relative_accuracy)
+        else:
+            # A few shards per worker keeps the pool busy when session sizes vary
+            shard_count = min(len(records), self.workers * 4)
+            shard_size = math.ceil(len(records) / shard_count)
+            shards = [records[i:i + shard_size] for i in range(0, len(records), shard_size)]
+            partial = self._run_pool(_aggregate_shard, shards)
+
+        return self._build_report(partial)
+
+    def generate_store_report(self, path):
+        """
+        Build a cohort report straight from a session store
+
+        Each worker streams its own byte range of the JSON lines file(s), so
+        no process ever holds more than one session's attempts at a time.
+        Lines that cannot be read as a session are counted in 'skipped_records'.
+
+        Args:
+            path (str): JSON lines file or directory of .jsonl files written by `save_session`
+
+        Returns:
+            dict: Same layout as `generate_report`
+        """
+        shards = _store_shards(path, self.workers * 4)
+
+        if self.workers <= 1 or len(shards) < 2:
+            partial = reduce(_merge_partials, [
+                _aggregate_store_shard(shard, self.group_by, self.relative_accuracy)
+                for shard in shards
+            ], _new_partial())
+        else:
+            partial = self._run_pool(_aggregate_store_shard, shards)
+
+        return self._build_report(partial)
+
+    def _run_pool(self, aggregate, shards):
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            partials = pool.map(
+                aggregate,
+                shards,
+                [self.group_by] * len(shards),
+                [self.relative_accuracy] * len(shards)
+            )
+            return reduce(_merge_partials, partials, _new_partial())
+
+    def _build_report(self, partial):
+        groups = partial['groups']
+        overall = _new_group(self.relative_accuracy)
+        for group in groups.values():
+            _merge_group(overall, group)
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'group_by': list(self.group_by),
+            'total_sessions': overall['sessions'],
+            'skipped_records': partial['skipped_records'],
+            'groups': {key: self._finalize(group) for key, group in sorted(groups.items())},
+            'overall': self._finalize(overall)
+        }
+
+    def _finalize(self, group):
+        counts = group['counts']
+        total = counts['attempts']
+        sketch = group['time_sketch']
+
+        time_distribution = {}
+        for label, value in [('min', sketch.min)] + [
+            (label, sketch.quantile(q)) for label, q in self.quantiles.items()
+        ] + [('max', sketch.max)]:
+            time_distribution[label] = round(value, 2) if value is not None else None
+
+        stuck = []
+        for (cohort, name), state in sorted(group['learners'].items()):
+            if state['level'] == self.difficulty_order[-1]:
+                continue
+            run_accuracy = state['run_correct'] / state['run_length']
+            if state['run_length'] >= self.stuck_after and run_accuracy < self.mastery_threshold:
+                stuck.append({
+                    'user_name': name,
+                    'cohort': dict(cohort),
+                    'level': state['level'],
+                    'attempts_at_level': state['run_length'],
+                    'sessions_at_level': state['run_sessions'],
+                    'since': state['since'],
+                    'accuracy': round(run_accuracy, 2)
+                })
+
+        return {
+            'total_sessions': group['sessions'],
+            'total_attempts': total,
+            'correct_answers': counts['correct'],
+            'overall_accuracy': round(counts['correct'] / total * 100, 2) if total else 0.0,
+            'avg_time_per_puzzle': round(counts['time_sum'] / 100 / total, 2) if total else 0.0,
+            'time_distribution': time_distribution,
+            'difficulty_stats': self._breakdown(group['by_difficulty']),
+            'operation_stats': self._breakdown(group['by_operation']),
+            'learners': len(group['learners']),
+            'stuck_learners': stuck
+        }
+
+    def _breakdown(self, by_name):
+        return {
+            name: {
+                'accuracy': round(counts['correct'] / counts['attempts'], 2),
+                'avg_time': round(counts['time_sum'] / 100 / counts['attempts'], 2),
+                'attempts': counts['attempts']
+            }
+            for name, counts in by_name.items()
+        }
@@ -5,8 +5,10 @@ import time
 from datetime import datetime
 
 class PerformanceTracker:
-    def __init__(self, user_name):
+    def __init__(self, user_name, cohort=None):
         self.user_name = user_name
+        # Optional labels such as {'school': ..., 'class': ...} used by cohort reports
+        self.cohort = dict(cohort or {})
         self.session_start = datetime.now()
         self.attempts = []
         self.current_streak = 0
@@ -112,3 +114,20 @@ class PerformanceTracker:
             'operation_stats': operation_stats,
             'final_difficulty': self.attempts[-1]['difficulty']
         }
+    
+    def export_session(self):
+        # Plain, JSON-friendly record of this session for storage and cohort reports
+        return {
+            'user_name': self.user_name,
+            'cohort': dict(self.cohort),
+            'session_start': self.session_start.isoformat(),
+            'attempts': [
+                {
+                    'difficulty': a['difficulty'],
+                    'operation': a['operation'],
+                    'time_taken': a['time_taken'],
+                    'is_correct': a['is_correct']
+                }
+                for a in self.attempts
+            ]
+        }
@@ -1,11 +1,16 @@
 """
 Test Script for Math Adventures System it validates all components work correctly
 """
+import os
+import random
 import sys
+import tempfile
 import time
+from datetime import datetime, timedelta
 from puzzle_generator import PuzzleGenerator
 from tracker import PerformanceTracker
 from adaptive_engine import AdaptiveEngine
+from report_engine import CohortReportEngine, QuantileSketch, save_session
 
 def test_puzzle_generator():
     #Test puzzle generation for all difficulty levels
@@ -119,6 +124,176 @@ def test_integration():
     
     print("\n✓ Integration Test: PASSED\n")
 
+def test_cohort_report():
+    #Test cohort rollups across many sessions, in-process and with a process pool
+    print("Testing Cohort Report Engine...")
+    generator = PuzzleGenerator()
+    sessions = []
+    
+    for s in range(12):
+        cohort = {'school': 'North', 'class': '3A' if s % 2 == 0 else '3B'}
+        tracker = PerformanceTracker(f"Student {s}", cohort=cohort)
+        for i in range(12):
+            puzzle = generator.generate_puzzle('easy')
+            # Student 0 keeps missing most answers at one level
+            is_correct = i % 4 == 0 if s == 0 else i % 6 != 0
+            tracker.log_attempt(puzzle, puzzle['answer'] if is_correct else 0, 2.0 + i, is_correct)
+        sessions.append(tracker)
+    
+    serial = CohortReportEngine(workers=1).generate_report(sessions)
+    parallel = CohortReportEngine(workers=2).generate_report(sessions)
+    
+    assert serial['groups'] == parallel['groups'], "Parallel report differs from serial"
+    assert set(serial['groups']) == {'North / 3A', 'North / 3B'}, "Unexpected groups"
+    
+    overall = serial['overall']
+    print(f"  Groups: {list(serial['groups'])}")
+    print(f"  Overall accuracy: {overall['overall_accuracy']:.1f}%")
+    print(f"  Median time: {overall['time_distribution']['p50']}s")
+    assert overall['total_attempts'] == 144, "Incorrect attempt count"
+    assert overall['learners'] == 12, "Incorrect learner count"
+    assert abs(overall['time_distribution']['p50'] - 7.5) < 0.6, "Median time out of range"
+    assert [l['user_name'] for l in overall['stuck_learners']] == ["Student 0"], "Wrong stuck learners"
+    
+    # Sketch merge should match a single sketch over the same values
+    left, right, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(1, 1001):
+        (left if i % 2 else right).add(i / 10)
+        whole.add(i / 10)
+    left.merge(right)
+    assert left.bins == whole.bins, "Merged sketch differs"
+    assert abs(whole.quantile(0.9) - 90.0) <= 90.0 * 0.01 + 0.1, "p90 outside accuracy bound"
+    
+    print("✓ Cohort Report Engine: PASSED\n")
+
+def make_session(name, cohort, levels, accuracy_every, start):
+    #Build a session at the given levels where every Nth answer is correct
+    generator = PuzzleGenerator()
+    tracker = PerformanceTracker(name, cohort=cohort)
+    tracker.session_start = start
+    for i, level in enumerate(levels):
+        puzzle = generator.generate_puzzle(level)
+        is_correct = i % accuracy_every == 0
+        tracker.log_attempt(puzzle, puzzle['answer'] if is_correct else 0, 4.0, is_correct)
+    return tracker
+
+def test_cohort_stuck_across_sessions():
+    #Test learners stuck over several short sessions, and learners sharing a name
+    print("Testing Cohort Stuck Detection...")
+    day = datetime(2026, 1, 5, 9, 0)
+    north = {'school': 'N', 'class': '3A'}
+    south = {'school': 'S', 'class': '4B'}
+    
+    # Ana stays at easy with ~33% accuracy over four 6-attempt sessions
+    sessions = [make_session("Ana", north, ['easy'] * 6, 3, day + timedelta(days=d)) for d in range(4)]
+    # Ben was stuck at easy but moved up to medium in his newest session
+    sessions += [make_session("Ben", north, ['easy'] * 6, 3, day + timedelta(days=d)) for d in range(3)]
+    sessions.append(make_session("Ben", north, ['easy'] * 2 + ['medium'] * 4, 3, day + timedelta(days=3)))
+    # Two different learners called Sam; only the one in N / 3A is stuck
+    sessions += [make_session("Sam", north, ['medium'] * 6, 4, day + timedelta(days=d)) for d in range(2)]
+    sessions.append(make_session("Sam", south, ['medium'] * 12, 1, day + timedelta(days=5)))
+    
+    expected = None
+    for seed in range(4):
+        shuffled = list(sessions)
+        random.Random(seed).shuffle(shuffled)
+        for workers in (1, 3):
+            report = CohortReportEngine(workers=workers).generate_report(shuffled)
+            if expected is None:
+                expected = report
+            assert report['groups'] == expected['groups'], "Report depends on merge order"
+            assert report['overall'] == expected['overall'], "Overall depends on merge order"
+    
+    overall = expected['overall']
+    stuck = {(l['cohort']['class'], l['user_name']): l for l in overall['stuck_learners']}
+    print(f"  Stuck learners: {sorted(stuck)}")
+    assert overall['learners'] == 4, "Learners with the same name were merged"
+    assert set(stuck) == {('3A', 'Ana'), ('3A', 'Sam')}, "Wrong stuck learners"
+    assert stuck[('3A', 'Ana')]['attempts_at_level'] == 24, "Run not counted across sessions"
+    assert stuck[('3A', 'Ana')]['sessions_at_level'] == 4, "Wrong session count"
+    
+    # Grouping by school only must still keep the two N school classes apart
+    north_b = {'school': 'N', 'class': '3B'}
+    school_sessions = [make_session("Sam", north, ['easy'] * 6, 1, day + timedelta(days=d)) for d in range(2)]
+    school_sessions += [make_session("Sam", north_b, ['easy'] * 6, 4, day + timedelta(days=d)) for d in range(2)]
+    school = CohortReportEngine(group_by=('school',), workers=1).generate_report(school_sessions)
+    north_report = school['groups']['N']
+    assert north_report['learners'] == 2, "Same-named learners merged across classes"
+    assert [l['cohort'] for l in north_report['stuck_learners']] == [north_b], "Wrong stuck learner"
+    assert north_report['stuck_learners'][0]['attempts_at_level'] == 12, "Wrong run length"
+    
+    # Learners at the top level have nowhere to move up to
+    top = [make_session("Kai", north, ['hard'] * 12, 4, day)]
+    assert CohortReportEngine(workers=1).generate_report(top)['overall']['stuck_learners'] == []
+    
+    # Long histories fold into one run rather than one entry per session
+    long_history = [make_session("Ana", north, ['easy'] * 6, 3, day + timedelta(hours=h)) for h in range(500)]
+    for workers in (1, 4):
+        run = CohortReportEngine(workers=workers).generate_report(long_history)['overall']['stuck_learners'][0]
+        assert run['attempts_at_level'] == 3000 and run['sessions_at_level'] == 500, "Long run miscounted"
+    
+    print("✓ Cohort Stuck Detection: PASSED\n")
+
+def test_cohort_store_report():
+    #Test that workers reading byte ranges of the store match the in-memory report
+    print("Testing Cohort Store Report...")
+    day = datetime(2026, 1, 5, 9, 0)
+    sessions = []
+    for s in range(30):
+        cohort = {'school': 'N', 'class': f"{s % 3 + 1}A"}
+        sessions.append(make_session(f"Student {s % 10}", cohort, ['easy'] * (5 + s % 7),
+                                     2 + s % 3, day + timedelta(hours=s)))
+    
+    with tempfile.TemporaryDirectory() as store:
+        path = os.path.join(store, 'sessions.jsonl')
+        for tracker in sessions:
+            save_session(path, tracker)
+        
+        expected = CohortReportEngine(workers=1).generate_report(sessions)
+        for workers in (1, 2, 5):
+            report = CohortReportEngine(workers=workers).generate_store_report(path)
+            assert report['groups'] == expected['groups'], "Store report differs"
+            assert report['total_sessions'] == 30, "Sessions lost at shard boundaries"
+    
+        # A half-written last record is skipped, not fatal
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"user_name": "Cut", "attempts": [{"diff')
+        for workers in (1, 2):
+            report = CohortReportEngine(workers=workers).generate_store_report(path)
+            assert report['skipped_records'] == 1, "Bad record not counted"
+            assert report['groups'] == expected['groups'], "Bad record changed the report"
+    
+    print(f"  Sessions: {expected['total_sessions']}, groups: {list(expected['groups'])}")
+    print("✓ Cohort Store Report: PASSED\n")
+
+def test_cohort_fractional_times():
+    #Test that serial and parallel reports match with non-integer response times
+    print("Testing Cohort Fractional Times...")
+    rng = random.Random(7)
+    generator = PuzzleGenerator()
+    sessions = []
+    for s in range(40):
+        tracker = PerformanceTracker(f"Student {s}", cohort={'school': 'N', 'class': f"{s % 4}A"})
+        for i in range(15):
+            puzzle = generator.generate_puzzle(rng.choice(['easy', 'medium', 'hard']))
+            is_correct = rng.random() < 0.7
+            tracker.log_attempt(puzzle, puzzle['answer'] if is_correct else 0, rng.uniform(1, 20), is_correct)
+        sessions.append(tracker)
+    
+    serial = CohortReportEngine(workers=1).generate_report(sessions)
+    parallel = CohortReportEngine(workers=4).generate_report(sessions)
+    assert serial['groups'] == parallel['groups'], "Parallel report differs from serial"
+    assert serial['overall'] == parallel['overall'], "Parallel overall differs from serial"
+    
+    try:
+        CohortReportEngine(workers=0)
+        assert False, "workers=0 should be rejected"
+    except ValueError:
+        pass
+    
+    print(f"  Avg time: {serial['overall']['avg_time_per_puzzle']}s")
+    print("✓ Cohort Fractional Times: PASSED\n")
+
 def run_all_tests():
     #Run all test suites
     print("\n" + "="*60)
@@ -129,6 +304,10 @@ def run_all_tests():
         test_puzzle_generator()
         test_performance_tracker()
         test_adaptive_engine()
+        test_cohort_report()
+        test_cohort_stuck_across_sessions()
+        test_cohort_store_report()
+        test_cohort_fractional_times()
         test_integration()
         
         print("="*60)